@@ -1,25 +1,68 @@
 import json
 import os
+import queue
+import threading
 import time
-from typing import Any, Dict
+from collections import deque
+from typing import Any, Dict, Optional
+
+from sink_jsonl import dumps_line
 
 CHECKPOINT_PATH = "/data/fortigate-runtime/work/checkpoint.json"
 ACTIVE_DEFAULT_PATH = "/data/fortigate-runtime/input/fortigate.log"
+COMPLETED_MAX = 5000
+
+# in-memory index of completed keys; underscore-prefixed entries are never persisted
+_COMPLETED_KEYS = "_completed_keys"
+
+# background writer: the ingest loop only snapshots, write+fsync happen off-thread.
+# One slot: a snapshot not yet picked up is replaced by the newer one.
+_CK_QUEUE: "queue.Queue[bytes]" = queue.Queue(maxsize=1)
+_CK_WRITER: Optional[threading.Thread] = None
+_CK_FAIL_LOCK = threading.Lock()
+_ck_write_fails = 0  # writer-side failures, folded into counters on the next save
 
-def _atomic_write_json(path: str, obj: Dict[str, Any]) -> None:
+def _atomic_write_bytes(path: str, data: bytes) -> None:
     tmp = f"{path}.tmp.{os.getpid()}"
-    data = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=False)
     os.makedirs(os.path.dirname(path), exist_ok=True)
-    with open(tmp, "w", encoding="utf-8") as f:
+    with open(tmp, "wb") as f:
         f.write(data)
-        f.write("\n")
         f.flush()
         os.fsync(f.fileno())
     os.replace(tmp, path)
 
+def _writer_loop() -> None:
+    global _ck_write_fails
+    while True:
+        data = _CK_QUEUE.get()
+        try:
+            _atomic_write_bytes(CHECKPOINT_PATH, data)
+        except Exception:
+            with _CK_FAIL_LOCK:
+                _ck_write_fails += 1
+        finally:
+            _CK_QUEUE.task_done()
+
+def _ensure_writer() -> None:
+    global _CK_WRITER
+    if _CK_WRITER is None or not _CK_WRITER.is_alive():
+        _CK_WRITER = threading.Thread(target=_writer_loop, name="checkpoint-writer", daemon=True)
+        _CK_WRITER.start()
+
+def _index_completed(ck: Dict[str, Any]) -> Dict[str, Any]:
+    completed = deque(ck.get("completed", []), maxlen=COMPLETED_MAX)
+    ck["completed"] = completed
+    ck[_COMPLETED_KEYS] = {item.get("key") for item in completed}
+    return ck
+
+def _serializable(ck: Dict[str, Any]) -> Dict[str, Any]:
+    out = {k: v for k, v in ck.items() if not k.startswith("_")}
+    out["completed"] = list(ck.get("completed", []))
+    return out
+
 def load_checkpoint() -> Dict[str, Any]:
     if not os.path.exists(CHECKPOINT_PATH):
-        return {
+        return _index_completed({
             "schema_version": 1,
             "active": {"path": ACTIVE_DEFAULT_PATH, "inode": None, "offset": 0, "last_event_ts_seen": None},
             "completed": [],  # list of {"key":..., "path":..., "inode":..., "size":..., "mtime":..., "completed_at":...}
@@ -33,27 +76,51 @@ def load_checkpoint() -> Dict[str, Any]:
                 "checkpoint_fail_total": 0
             },
             "updated_at": int(time.time())
-        }
+        })
     with open(CHECKPOINT_PATH, "r", encoding="utf-8") as f:
-        return json.load(f)
+        return _index_completed(json.load(f))
+
+def save_checkpoint(ck: Dict[str, Any], wait: bool = False) -> None:
+    """
+    Snapshot ck and hand it to the background writer.
+    wait=True (shutdown/crash paths) drains the writer and writes in the caller,
+    so the file is on disk and errors propagate on return.
+    """
+    global _ck_write_fails
+    with _CK_FAIL_LOCK:
+        fails, _ck_write_fails = _ck_write_fails, 0
+    if fails:
+        ck["counters"]["checkpoint_fail_total"] += fails
 
-def save_checkpoint(ck: Dict[str, Any]) -> None:
     ck["updated_at"] = int(time.time())
-    _atomic_write_json(CHECKPOINT_PATH, ck)
+    data = dumps_line(_serializable(ck))
+
+    if wait:
+        _CK_QUEUE.join()
+        _atomic_write_bytes(CHECKPOINT_PATH, data)
+        return
+
+    _ensure_writer()
+    try:
+        _CK_QUEUE.get_nowait()  # superseded snapshot
+        _CK_QUEUE.task_done()
+    except queue.Empty:
+        pass
+    _CK_QUEUE.put_nowait(data)
 
 def completed_key(path: str, inode: int, size: int, mtime: int) -> str:
     return f"{path}|{inode}|{size}|{mtime}"
 
 def is_completed(ck: Dict[str, Any], path: str, inode: int, size: int, mtime: int) -> bool:
-    key = completed_key(path, inode, size, mtime)
-    for item in ck.get("completed", []):
-        if item.get("key") == key:
-            return True
-    return False
+    return completed_key(path, inode, size, mtime) in ck[_COMPLETED_KEYS]
 
 def mark_completed(ck: Dict[str, Any], path: str, inode: int, size: int, mtime: int) -> None:
     key = completed_key(path, inode, size, mtime)
-    ck.setdefault("completed", []).append({
+    completed = ck["completed"]
+    if len(completed) == completed.maxlen:
+        # deque drops the oldest entry on append; keep the key index in step
+        ck[_COMPLETED_KEYS].discard(completed[0].get("key"))
+    completed.append({
         "key": key,
         "path": path,
         "inode": inode,
@@ -61,5 +128,4 @@ def mark_completed(ck: Dict[str, Any], path: str, inode: int, size: int, mtime:
         "mtime": mtime,
         "completed_at": int(time.time())
     })
-    if len(ck["completed"]) > 5000:
-        ck["completed"] = ck["completed"][-5000:]
+    ck[_COMPLETED_KEYS].add(key)
@@ -1,4 +1,3 @@
-import datetime
 import os
 import signal
 import sys
@@ -11,7 +10,16 @@ if _THIS_DIR not in sys.path:
 
 from checkpoint import load_checkpoint, save_checkpoint, is_completed, mark_completed
 from parser_fgt_v1 import parse_fortigate_line
-from sink_jsonl import append_event, append_dlq, append_metrics
+from sink_jsonl import (
+    DLQ_PREFIX,
+    EVENTS_PREFIX,
+    append_event,
+    append_dlq,
+    append_metrics,
+    flush_sinks,
+    close_sinks,
+    take_write_failures,
+)
 from source_file import (
     ACTIVE_PATH,
     list_rotated_files,
@@ -32,9 +40,19 @@ IDLE_SLEEP_SEC = 0.2
 # follow_active_binary 在无数据时最多等多久返回（秒）
 ACTIVE_POLL_MAX_WAIT_SEC = 0.5
 
+# tail 过程中 inode 复查频率：每 N 行或每 N 秒 stat 一次，而不是每行
+ACTIVE_INODE_CHECK_LINES = 1024
+ACTIVE_INODE_CHECK_SEC = 0.25
+
 # 全局退出标志
 _SHOULD_STOP = False
 
+# ingest_ts 格式化缓存：同一秒内只 strftime 一次
+_ISO_CACHE: Dict[str, Any] = {"sec": -1, "prefix": ""}
+
+# 本地年份缓存：until 为下一个本地元旦的 epoch 秒
+_YEAR_CACHE: Dict[str, Any] = {"year": 0, "until": 0.0}
+
 
 def _handle_stop_signal(signum: int, frame: Any) -> None:
     global _SHOULD_STOP
@@ -49,6 +67,33 @@ def _ingest_ts() -> int:
     return int(time.time())
 
 
+def _iso_now() -> str:
+    """
+    UTC now in the same format as datetime.now(timezone.utc).isoformat().
+    """
+    t = time.time()
+    s = int(t)
+    if s != _ISO_CACHE["sec"]:
+        _ISO_CACHE["sec"] = s
+        _ISO_CACHE["prefix"] = time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(s))
+    us = int((t - s) * 1e6)
+    if us:
+        return f"{_ISO_CACHE['prefix']}.{us:06d}+00:00"
+    return f"{_ISO_CACHE['prefix']}+00:00"
+
+
+def _now_year() -> int:
+    """
+    Local current year (as datetime.now().year), recomputed only when a new year starts.
+    """
+    now = time.time()
+    if now >= _YEAR_CACHE["until"]:
+        year = time.localtime(now).tm_year
+        _YEAR_CACHE["year"] = year
+        _YEAR_CACHE["until"] = time.mktime((year + 1, 1, 1, 0, 0, 0, 0, 0, -1))
+    return _YEAR_CACHE["year"]
+
+
 def _ensure_dirs() -> None:
     os.makedirs("/data/fortigate-runtime/output/parsed", exist_ok=True)
     os.makedirs("/data/fortigate-runtime/work", exist_ok=True)
@@ -57,7 +102,7 @@ def _ensure_dirs() -> None:
 def _write_dlq(ck: Dict[str, Any], reason: str, raw: str, source: Dict[str, Any]) -> None:
     dlq = {
         "schema_version": 1,
-        "ingest_ts": datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        "ingest_ts": _iso_now(),
         "reason": reason,
         "source": source,
         "raw": raw,
@@ -71,7 +116,7 @@ def _write_dlq(ck: Dict[str, Any], reason: str, raw: str, source: Dict[str, Any]
 
 
 def _write_event(ck: Dict[str, Any], event: Dict[str, Any], source: Dict[str, Any]) -> None:
-    event["ingest_ts"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    event["ingest_ts"] = _iso_now()
     event["source"] = {"path": source.get("path"), "inode": source.get("inode"), "offset": source.get("offset")}
     try:
         append_event(_ingest_ts(), event)
@@ -98,14 +143,14 @@ def process_rotated_files(ck: Dict[str, Any]) -> int:
         if is_completed(ck, path, inode, size, mtime):
             continue
 
-        for line, src in read_whole_file_lines(path):
+        now_year = _now_year()
+        for line, src, nbytes in read_whole_file_lines(path):
             processed += 1
 
             raw = line
             ck["counters"]["lines_in_total"] += 1
-            ck["counters"]["bytes_in_total"] += len(raw.encode("utf-8", errors="replace"))
+            ck["counters"]["bytes_in_total"] += nbytes
 
-            now_year = datetime.datetime.now().year
             event, dlq = parse_fortigate_line(raw, now_year)
             if event is not None:
                 _write_event(ck, event, src)
@@ -165,24 +210,33 @@ def process_active_tail(ck: Dict[str, Any], max_seconds: float = 2.0) -> int:
     _handle_active_truncate_if_any(ck)
 
     offset = int(ck["active"].get("offset", 0))
+    now_year = _now_year()
+
+    lines_since_check = 0
+    last_inode_check = start
 
     # follow_active_binary returns if idle for ACTIVE_POLL_MAX_WAIT_SEC
-    for line, new_offset in follow_active_binary(offset, max_wait_sec=ACTIVE_POLL_MAX_WAIT_SEC):
+    for line, new_offset, nbytes in follow_active_binary(offset, max_wait_sec=ACTIVE_POLL_MAX_WAIT_SEC):
         processed += 1
 
         # if inode flips while reading, stop and let next loop handle from offset 0
-        new_inode = active_inode()
-        if new_inode is not None and new_inode != ck["active"]["inode"]:
-            ck["active"]["inode"] = new_inode
-            ck["active"]["offset"] = 0
-            break
+        # (throttled: rotation is rare, a stat per line is not)
+        lines_since_check += 1
+        now = time.time()
+        if lines_since_check >= ACTIVE_INODE_CHECK_LINES or (now - last_inode_check) >= ACTIVE_INODE_CHECK_SEC:
+            lines_since_check = 0
+            last_inode_check = now
+            new_inode = active_inode()
+            if new_inode is not None and new_inode != ck["active"]["inode"]:
+                ck["active"]["inode"] = new_inode
+                ck["active"]["offset"] = 0
+                break
 
         raw = line
         ck["counters"]["lines_in_total"] += 1
-        ck["counters"]["bytes_in_total"] += len(raw.encode("utf-8", errors="replace"))
+        ck["counters"]["bytes_in_total"] += nbytes
 
         src = {"path": ACTIVE_PATH, "inode": ck["active"]["inode"], "offset": new_offset}
-        now_year = datetime.datetime.now().year
         event, dlq = parse_fortigate_line(raw, now_year)
         if event is not None:
             _write_event(ck, event, src)
@@ -193,15 +247,36 @@ def process_active_tail(ck: Dict[str, Any], max_seconds: float = 2.0) -> int:
         ck["active"]["offset"] = int(new_offset)
         offset = int(new_offset)
 
-        if (time.time() - start) >= max_seconds:
+        if (now - start) >= max_seconds:
             break
 
     return processed
 
 
-def _flush_checkpoint(ck: Dict[str, Any]) -> None:
+def _count_write_failures(ck: Dict[str, Any]) -> None:
+    # queued lines were counted as written on append; move the dropped ones to write_fail_total
+    c = ck["counters"]
+    for prefix, n in take_write_failures().items():
+        c["write_fail_total"] += n
+        if prefix == EVENTS_PREFIX:
+            c["events_out_total"] -= n
+        elif prefix == DLQ_PREFIX:
+            c["dlq_out_total"] -= n
+            c["parse_fail_total"] -= n
+
+
+def _flush_checkpoint(ck: Dict[str, Any], wait: bool = False) -> None:
+    # output first: a saved offset must never cover lines not yet on disk
     try:
-        save_checkpoint(ck)
+        flush_sinks()
+    except Exception:
+        ck["counters"]["write_fail_total"] += 1
+        return
+    finally:
+        _count_write_failures(ck)
+    try:
+        # periodic saves are written by a background thread; exit paths wait
+        save_checkpoint(ck, wait=wait)
     except Exception:
         ck["counters"]["checkpoint_fail_total"] += 1
 
@@ -225,12 +300,13 @@ def main() -> int:
         while True:
             if _SHOULD_STOP:
                 # graceful shutdown: flush checkpoint and exit 0
-                _flush_checkpoint(ck)
+                _flush_checkpoint(ck, wait=True)
                 # best-effort final metrics
                 try:
                     now = _now_ts()
                     metric = mw.build_metrics(ck, now)
                     append_metrics(now, metric)
+                    close_sinks()
                 except Exception:
                     pass
                 return 0
@@ -256,11 +332,11 @@ def main() -> int:
                 time.sleep(IDLE_SLEEP_SEC)
 
     except KeyboardInterrupt:
-        _flush_checkpoint(ck)
+        _flush_checkpoint(ck, wait=True)
         return 0
     except Exception:
         # crash path: try to persist checkpoint for post-mortem, then exit non-zero
-        _flush_checkpoint(ck)
+        _flush_checkpoint(ck, wait=True)
         return 2
 
 
@@ -1,75 +1,160 @@
 import datetime
+import functools
 import hashlib
 import re
-from typing import Any, Dict, Optional, Tuple
+from sys import intern
+from typing import Any, Dict, FrozenSet, Optional, Tuple
 
 MONTHS = {
     "Jan": 1, "Feb": 2, "Mar": 3, "Apr": 4, "May": 5, "Jun": 6,
     "Jul": 7, "Aug": 8, "Sep": 9, "Oct": 10, "Nov": 11, "Dec": 12
 }
 
+# header only: the body is sliced off at m.end() instead of being captured by a
+# trailing (?P<body>.*)$, and groups are read positionally via m.groups()
 SYSLOG_RE = re.compile(
-    r"^(?P<mon>[A-Z][a-z]{2})\s+(?P<day>\d{1,2})\s+(?P<time>\d{2}:\d{2}:\d{2})\s+(?P<host>\S+)\s+(?P<body>.*)$"
+    r"(?P<mon>[A-Z][a-z]{2})\s+(?P<day>\d{1,2})\s+(?P<time>\d{2}:\d{2}:\d{2})\s+(?P<host>\S+)\s+"
 )
 
+# key=value or key="value"; quoted values with escapes are left to the slow path
+KV_RE = re.compile(r'([^= ]+)=(?:"([^"\\]*)"|((?!")[^ ]*)) *')
+
+# event fields copied from kv, in output order; True marks integer fields
+EVENT_KV_FIELDS: Tuple[Tuple[str, bool], ...] = (
+    ("type", False),
+    ("subtype", False),
+    ("level", False),
+    ("devname", False),
+    ("devid", False),
+    ("vd", False),
+    ("action", False),
+    ("policyid", True),
+    ("proto", True),
+    ("service", False),
+    ("srcip", False),
+    ("srcport", True),
+    ("srcintf", False),
+    ("srcintfrole", False),
+    ("dstip", False),
+    ("dstport", True),
+    ("dstintf", False),
+    ("dstintfrole", False),
+    ("sentbyte", True),
+    ("rcvdbyte", True),
+    ("sentpkt", True),
+    ("rcvdpkt", True),
+)
+_EVENT_KV_NAMES = tuple(k for k, _ in EVENT_KV_FIELDS)
+
+# every kv key the event is built from, incl. those read by parse_event_ts
+WANTED_KEYS: FrozenSet[str] = frozenset(_EVENT_KV_NAMES + ("date", "time", "tz"))
+
+TZ_CACHE_SIZE = 64
+EVENT_TS_CACHE_SIZE = 4096
+
+TZ_RE = re.compile(r"[+-]\d{4}")
+
+# control characters other than \t and \n
+CTRL_RE = re.compile(r"[\x00-\x08\x0b-\x1f]")
+
 def _has_binary_garbage(s: str) -> bool:
     if "\x00" in s:
         return True
-    bad = sum(1 for ch in s if ord(ch) < 9 or (11 <= ord(ch) < 32))
-    return bad > 5
+    if CTRL_RE.search(s) is None:
+        return False
+    return len(CTRL_RE.findall(s)) > 5
 
-def parse_kv(body: str) -> Dict[str, str]:
+def parse_kv(body: str, keys: Optional[FrozenSet[str]] = None) -> Dict[str, str]:
     """
     Parse FortiGate kv pairs: key=value or key="value with spaces"
     Supports backslash-escaped quotes inside quoted values.
+
+    Each pair is tokenized by KV_RE in C; only quoted values containing a
+    backslash (or missing the closing quote) fall back to the manual scan.
+    If keys is given, other pairs are skipped and kept keys are interned.
     """
     out: Dict[str, str] = {}
     i = 0
     n = len(body)
+    match = KV_RE.match
 
-    while i < n:
-        while i < n and body[i] == " ":
-            i += 1
-        if i >= n:
-            break
+    while i < n and body[i] == " ":
+        i += 1
 
-        k_start = i
-        while i < n and body[i] not in "= ":
-            i += 1
-        key = body[k_start:i]
-        if not key or i >= n or body[i] != "=":
+    while i < n:
+        m = match(body, i)
+        if m is not None:
+            key, quoted, bare = m.groups()
+            i = m.end()
+            if keys is None:
+                out[key] = bare if quoted is None else quoted
+            elif key in keys:
+                out[intern(key)] = bare if quoted is None else quoted
+            continue
+
+        eq = body.find("=", i)
+        if eq == -1 or eq == i or body.find(" ", i, eq) != -1:
+            # empty key, or key terminated by a space
             break
-        i += 1  # skip '='
+        key = body[i:eq]
+        keep = keys is None or key in keys
+        i = eq + 2  # skip '="'
+
+        v_parts = []
+        while True:
+            q = body.find('"', i)
+            end = n if q == -1 else q
+            bs = body.find("\\", i, end)
+            if bs == -1 or bs + 1 >= n:
+                if keep:
+                    v_parts.append(body[i:end])
+                i = end + 1
+                break
+            if keep:
+                v_parts.append(body[i:bs])
+                v_parts.append(body[bs + 1])
+            i = bs + 2
+        if keep:
+            out[key if keys is None else intern(key)] = "".join(v_parts)
 
-        if i < n and body[i] == '"':
+        while i < n and body[i] == " ":
             i += 1
-            v_chars = []
-            while i < n:
-                ch = body[i]
-                if ch == "\\" and i + 1 < n:
-                    v_chars.append(body[i + 1])
-                    i += 2
-                    continue
-                if ch == '"':
-                    i += 1
-                    break
-                v_chars.append(ch)
-                i += 1
-            value = "".join(v_chars)
-            while i < n and body[i] == " ":
-                i += 1
-        else:
-            v_start = i
-            while i < n and body[i] != " ":
-                i += 1
-            value = body[v_start:i]
-            while i < n and body[i] == " ":
-                i += 1
-
-        out[key] = value
 
     return out
 
+def _parse_body(body: str) -> Tuple[Dict[str, str], Tuple[Any, ...]]:
+    """
+    Parse a syslog body into (kv, EVENT_KV_FIELDS values).
+    """
+    kv = parse_kv(body, WANTED_KEYS)
+    fields = tuple(_to_int(kv.get(k)) if is_int else kv.get(k) for k, is_int in EVENT_KV_FIELDS)
+    return kv, fields
+
+@functools.lru_cache(maxsize=TZ_CACHE_SIZE)
+def _tzinfo_for(tz: str) -> Optional[datetime.timezone]:
+    """
+    FortiGate tz value ("+0800", quoted or not) -> fixed-offset tzinfo, None if not +HHMM/-HHMM.
+    Raises ValueError for a well-formed offset outside +-24h.
+    """
+    tz_clean = tz.strip().strip('"')
+    if not TZ_RE.fullmatch(tz_clean):
+        return None
+    sign = 1 if tz_clean[0] == "+" else -1
+    hh = int(tz_clean[1:3])
+    mm = int(tz_clean[3:5])
+    return datetime.timezone(datetime.timedelta(hours=sign * hh, minutes=sign * mm))
+
+@functools.lru_cache(maxsize=EVENT_TS_CACHE_SIZE)
+def _fast_event_ts(date_s: str, time_s: str, tzinfo: Optional[datetime.timezone]) -> Optional[str]:
+    # fromisoformat (C) beats slicing the digits out by hand; the cache absorbs
+    # the many events sharing one second. None sends the caller to the fallback.
+    try:
+        dt = datetime.datetime.fromisoformat(f"{date_s}T{time_s}")
+        # no usable tz: keep any offset fromisoformat parsed from the value itself
+        return (dt.replace(tzinfo=tzinfo) if tzinfo is not None else dt).isoformat()
+    except Exception:
+        return None
+
 def parse_event_ts(
     kv: Dict[str, str],
     default_year: int,
@@ -78,48 +163,33 @@ def parse_event_ts(
     fallback_time: str
 ) -> Optional[str]:
     tz = kv.get("tz")
-    if tz:
-        tz_clean = tz.strip().strip('"')
-        if re.fullmatch(r"[+-]\d{4}", tz_clean):
-            tz_norm = tz_clean[:3] + ":" + tz_clean[3:]
-        else:
-            tz_norm = None
-    else:
-        tz_norm = None
+    try:
+        tzinfo = _tzinfo_for(tz) if tz else None
+    except ValueError:
+        # out-of-range offset: neither the kv nor the header timestamp can use it
+        return None
 
     date_s = kv.get("date")  # YYYY-MM-DD
     time_s = kv.get("time")  # HH:MM:SS
     if date_s and time_s:
-        try:
-            dt = datetime.datetime.fromisoformat(f"{date_s}T{time_s}")
-            if tz_norm:
-                sign = 1 if tz_norm[0] == "+" else -1
-                hh = int(tz_norm[1:3])
-                mm = int(tz_norm[4:6])
-                return dt.replace(
-                    tzinfo=datetime.timezone(datetime.timedelta(hours=sign * hh, minutes=sign * mm))
-                ).isoformat()
-            return dt.isoformat()
-        except Exception:
-            pass
+        event_ts = _fast_event_ts(date_s, time_s, tzinfo)
+        if event_ts is not None:
+            return event_ts
 
     try:
         hh, mm, ss = [int(x) for x in fallback_time.split(":")]
-        dt = datetime.datetime(default_year, fallback_mon, fallback_day, hh, mm, ss)
-        if tz_norm:
-            sign = 1 if tz_norm[0] == "+" else -1
-            h = int(tz_norm[1:3])
-            m = int(tz_norm[4:6])
-            return dt.replace(
-                tzinfo=datetime.timezone(datetime.timedelta(hours=sign * h, minutes=sign * m))
-            ).isoformat()
+        dt = datetime.datetime(default_year, fallback_mon, fallback_day, hh, mm, ss, tzinfo=tzinfo)
         return dt.isoformat()
     except Exception:
         return None
 
+# SHA-256 stays: OpenSSL's SHA-NI path beats blake2 on short lines, and
+# changing the hash would change every event_id downstream dedups on
+_sha256 = hashlib.sha256
+
 def stable_event_id(raw_line: str) -> str:
-    h = hashlib.sha256(raw_line.encode("utf-8", errors="replace")).hexdigest()
-    return h[:32]
+    # first 16 digest bytes == first 32 hex chars of hexdigest()
+    return _sha256(raw_line.encode("utf-8", "replace")).digest()[:16].hex()
 
 def parse_fortigate_line(raw_line: str, now_year: int) -> Tuple[Optional[Dict[str, Any]], Optional[Dict[str, Any]]]:
     """
@@ -140,18 +210,16 @@ def parse_fortigate_line(raw_line: str, now_year: int) -> Tuple[Optional[Dict[st
     if not m:
         return None, {"reason": "syslog_header_parse_fail", "raw": raw_line}
 
-    mon = m.group("mon")
-    day = int(m.group("day"))
-    tstr = m.group("time")
-    host = m.group("host")
-    body = m.group("body")
+    mon, day_s, tstr, host = m.groups()
+    day = int(day_s)
+    body = line[m.end():]
 
     mon_i = MONTHS.get(mon)
     if not mon_i:
         return None, {"reason": "invalid_month", "raw": raw_line}
 
     try:
-        kv = parse_kv(body)
+        kv, fields = _parse_body(body)
     except Exception:
         return None, {"reason": "kv_parse_exception", "raw": raw_line}
 
@@ -162,30 +230,9 @@ def parse_fortigate_line(raw_line: str, now_year: int) -> Tuple[Optional[Dict[st
         "event_id": stable_event_id(raw_line),
         "host": host,
         "event_ts": event_ts,
-        "type": kv.get("type"),
-        "subtype": kv.get("subtype"),
-        "level": kv.get("level"),
-        "devname": kv.get("devname"),
-        "devid": kv.get("devid"),
-        "vd": kv.get("vd"),
-        "action": kv.get("action"),
-        "policyid": _to_int(kv.get("policyid")),
-        "proto": _to_int(kv.get("proto")),
-        "service": kv.get("service"),
-        "srcip": kv.get("srcip"),
-        "srcport": _to_int(kv.get("srcport")),
-        "srcintf": kv.get("srcintf"),
-        "srcintfrole": kv.get("srcintfrole"),
-        "dstip": kv.get("dstip"),
-        "dstport": _to_int(kv.get("dstport")),
-        "dstintf": kv.get("dstintf"),
-        "dstintfrole": kv.get("dstintfrole"),
-        "sentbyte": _to_int(kv.get("sentbyte")),
-        "rcvdbyte": _to_int(kv.get("rcvdbyte")),
-        "sentpkt": _to_int(kv.get("sentpkt")),
-        "rcvdpkt": _to_int(kv.get("rcvdpkt")),
-        "parse_status": "ok"
     }
+    event.update(zip(_EVENT_KV_NAMES, fields))
+    event["parse_status"] = "ok"
 
     core_missing = any(event.get(k) is None for k in ["type", "subtype", "action"])
     if core_missing:
@@ -193,8 +240,14 @@ def parse_fortigate_line(raw_line: str, now_year: int) -> Tuple[Optional[Dict[st
 
     return event, None
 
+# ASCII characters int() accepts first: sign, digit or (stripped) whitespace
+_INT_LEAD = frozenset("+-0123456789" + "".join(c for c in map(chr, range(128)) if c.isspace()))
+
 def _to_int(x: Optional[str]) -> Optional[int]:
-    if x is None:
+    # reject None, "" and obvious non-numbers without raising
+    if not x:
+        return None
+    if x[0] not in _INT_LEAD and x.isascii():
         return None
     try:
         return int(x)
@@ -1,36 +1,152 @@
 import json
 import os
 import time
-from typing import Any, Dict
+from collections import defaultdict
+from typing import Any, BinaryIO, DefaultDict, Dict, List, Tuple
+
+try:
+    import orjson  # optional: several times faster, emits bytes directly
+except ImportError:
+    orjson = None
 
 PARSED_DIR = "/data/fortigate-runtime/output/parsed"
 EVENTS_PREFIX = "events"
 DLQ_PREFIX = "dlq"
 METRICS_PREFIX = "metrics"
 
+# open append handles keyed by (prefix, hour_key); at most one per prefix
+_SINKS: Dict[Tuple[str, str], BinaryIO] = {}
+
+# encoded lines waiting for flush_pending(), same keys as _SINKS
+_PENDING: DefaultDict[Tuple[str, str], List[bytes]] = defaultdict(list)
+# hand a queue to its sink early once it grows this long, to bound memory
+_PENDING_MAX_LINES = 4096
+# queued lines dropped because their write failed, per prefix; see take_write_failures()
+_WRITE_FAILS: DefaultDict[str, int] = defaultdict(int)
+
+# built once: json.dumps() with non-default options creates a new encoder per call
+_JSON_ENCODER = json.JSONEncoder(ensure_ascii=False, separators=(",", ":"), sort_keys=False)
+
+
+# last computed hour key and the [start, end) epoch window of that local hour
+_HOUR_KEY_CACHE: Dict[str, Any] = {"start": 0, "end": 0, "key": ""}
+
 
 def _hour_key(ts_epoch: int) -> str:
+    c = _HOUR_KEY_CACHE
+    if c["start"] <= ts_epoch < c["end"]:
+        return c["key"]
     t = time.localtime(ts_epoch)
-    return f"{t.tm_year:04d}{t.tm_mon:02d}{t.tm_mday:02d}-{t.tm_hour:02d}"
+    # window from the local wall clock, not ts // 3600: stays correct for half-hour UTC offsets
+    start = int(ts_epoch) - t.tm_min * 60 - t.tm_sec
+    c["start"] = start
+    c["end"] = start + 3600
+    c["key"] = f"{t.tm_year:04d}{t.tm_mon:02d}{t.tm_mday:02d}-{t.tm_hour:02d}"
+    return c["key"]
 
 
 def _path_for(prefix: str, hour_key: str) -> str:
     return os.path.join(PARSED_DIR, f"{prefix}-{hour_key}.jsonl")
 
 
-def _append_line(path: str, line: str) -> None:
-    os.makedirs(PARSED_DIR, exist_ok=True)
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(line)
+def _close_sink(f: BinaryIO) -> None:
+    f.flush()
+    os.fsync(f.fileno())
+    f.close()
+
+
+def _sink_for(prefix: str, hour_key: str) -> BinaryIO:
+    key = (prefix, hour_key)
+    f = _SINKS.get(key)
+    if f is None:
+        # hour rollover: retire the previous file of this prefix
+        for stale in [k for k in _SINKS if k[0] == prefix]:
+            _close_sink(_SINKS.pop(stale))
+        # misses are rare (once per hour per prefix), so recheck the dir: it may be removed at runtime
+        os.makedirs(PARSED_DIR, exist_ok=True)
+        f = open(_path_for(prefix, hour_key), "ab", buffering=1 << 16)
+        _SINKS[key] = f
+    return f
+
+
+def dumps_line(obj: Dict[str, Any]) -> bytes:
+    """
+    One compact JSON line as bytes; also used for the checkpoint file.
+    orjson spells large floats without '+' in the exponent (9.3e16 vs 9.3e+16).
+    """
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_APPEND_NEWLINE)
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits; the stdlib encoder handles them
+    return (_JSON_ENCODER.encode(obj) + "\n").encode("utf-8")
+
+
+def _write_pending(key: Tuple[str, str]) -> None:
+    """
+    Take the queue of key and write it with one writelines().
+    On failure the lines are dropped and counted, never retried: a partial write
+    must not be repeated, and a dead disk must not grow the queue.
+    """
+    lines = _PENDING.pop(key, None)
+    if not lines:
+        return
+    try:
+        _sink_for(*key).writelines(lines)
+    except Exception:
+        _WRITE_FAILS[key[0]] += len(lines)
+        # reopen on the next write instead of reusing a handle in an unknown state
+        f = _SINKS.pop(key, None)
+        if f is not None:
+            try:
+                f.close()
+            except Exception:
+                pass
+
+
+def append_jsonl(prefix: str, ts_epoch: int, obj: Dict[str, Any]) -> None:
+    key = (prefix, _hour_key(ts_epoch))
+    lines = _PENDING[key]
+    lines.append(dumps_line(obj))
+    if len(lines) >= _PENDING_MAX_LINES:
+        _write_pending(key)
+
+
+def flush_pending() -> None:
+    """
+    Write every queued line to its sink with one writelines() per file.
+    Queues are visited in insertion order, so an hour's lines land before its file is rolled over.
+    """
+    for key in list(_PENDING):
+        _write_pending(key)
+
+
+def take_write_failures() -> Dict[str, int]:
+    """
+    Return the number of queued lines dropped per prefix since the last call, and reset it.
+    Those lines were already counted as written when they were appended.
+    """
+    fails = dict(_WRITE_FAILS)
+    _WRITE_FAILS.clear()
+    return fails
+
+
+def flush_sinks() -> None:
+    """
+    Write queued lines, then flush and fsync every open sink.
+    Must run before the checkpoint is saved so output on disk never lags the saved offset.
+    """
+    flush_pending()
+    for f in _SINKS.values():
         f.flush()
         os.fsync(f.fileno())
 
 
-def append_jsonl(prefix: str, ts_epoch: int, obj: Dict[str, Any]) -> None:
-    hour_key = _hour_key(ts_epoch)
-    path = _path_for(prefix, hour_key)
-    line = json.dumps(obj, ensure_ascii=False, separators=(",", ":"), sort_keys=False) + "\n"
-    _append_line(path, line)
+def close_sinks() -> None:
+    flush_pending()
+    while _SINKS:
+        _, f = _SINKS.popitem()
+        _close_sink(f)
 
 
 def append_event(ts_epoch: int, event: Dict[str, Any]) -> None:
@@ -1,14 +1,21 @@
-import gzip
 import os
 import re
 import time
-from typing import Dict, Generator, List, Optional, Tuple
+import zlib
+from typing import Dict, Generator, Iterable, List, Optional, Tuple
 
 DIR = "/data/fortigate-runtime/input"
 ACTIVE_PATH = "/data/fortigate-runtime/input/fortigate.log"
 
 ROTATED_RE = re.compile(r"^fortigate\.log-(\d{8}-\d{6})(?:\.gz)?$")
 
+# active tail read size; the file is opened unbuffered since we chunk ourselves
+_READ_CHUNK = 64 * 1024
+
+# rotated segments: plain bytes per read1() / compressed bytes fed to zlib per read
+_ROTATED_READ_CHUNK = 1024 * 1024
+_GZ_READ_CHUNK = 256 * 1024
+
 
 def list_rotated_files() -> List[str]:
     files: List[str] = []
@@ -32,34 +39,105 @@ def stat_file(path: str) -> Tuple[int, int, int]:
     return (st.st_ino, st.st_size, int(st.st_mtime))
 
 
-def read_whole_file_lines(path: str) -> Generator[Tuple[str, Dict], None, None]:
+def _split_lines(chunks: Iterable[bytes]) -> Generator[bytes, None, None]:
+    """
+    Re-cut a stream of byte chunks into raw lines (newline included).
+    One bytes.split per chunk; a trailing line without newline is yielded last.
+    The unfinished line is kept in a bytearray and only joined onto the first line of a
+    chunk that has a newline, so a long run without newlines is not re-copied per chunk.
+    """
+    carry = bytearray()
+    for chunk in chunks:
+        if b"\n" not in chunk:
+            carry += chunk
+            continue
+        lines = chunk.split(b"\n")
+        if carry:
+            carry += lines[0]
+            lines[0] = bytes(carry)
+            carry.clear()
+        carry += lines.pop()
+        for part in lines:
+            yield part + b"\n"
+    if carry:
+        yield bytes(carry)
+
+
+def _iter_plain_chunks(path: str) -> Generator[bytes, None, None]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read1(_ROTATED_READ_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _iter_gz_chunks(path: str) -> Generator[bytes, None, None]:
+    """
+    Yield decompressed data of a gzip file, fed to zlib in large chunks.
+    Like gzip.open: concatenated members are followed, NUL padding is skipped and a
+    truncated stream raises EOFError.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        d = zlib.decompressobj(31)
+        empty = True
+        while True:
+            raw = os.read(fd, _GZ_READ_CHUNK)
+            if not raw:
+                break
+            empty = False
+            data = d.decompress(raw)
+            while d.eof:
+                rest = d.unused_data.lstrip(b"\x00")
+                if not rest:
+                    break
+                d = zlib.decompressobj(31)
+                data += d.decompress(rest)
+            if data:
+                yield data
+
+        if not d.eof and not empty:
+            raise EOFError("Compressed file ended before the end-of-stream marker was reached")
+    finally:
+        os.close(fd)
+
+
+def read_whole_file_lines(path: str) -> Generator[Tuple[str, Dict, int], None, None]:
+    """
+    Read a rotated segment from the start. Yield (line, source, line_nbytes).
+    Plain and gzip segments are read in large chunks and split on newlines in C,
+    so the byte length (and plain-file offset) comes free.
+    """
     inode, size, mtime = stat_file(path)
     is_gz = path.endswith(".gz")
     if is_gz:
-        with gzip.open(path, "rt", encoding="utf-8", errors="replace") as f:
-            for line in f:
-                yield line, {"path": path, "inode": inode, "offset": None, "size": size, "mtime": mtime}
+        for line_bytes in _split_lines(_iter_gz_chunks(path)):
+            line = line_bytes.decode("utf-8", errors="replace")
+            yield line, {"path": path, "inode": inode, "offset": None, "size": size, "mtime": mtime}, len(line_bytes)
     else:
         offset = 0
-        with open(path, "r", encoding="utf-8", errors="replace") as f:
-            for line in f:
-                yield line, {"path": path, "inode": inode, "offset": offset, "size": size, "mtime": mtime}
-                offset += len(line.encode("utf-8", errors="replace"))
+        for line_bytes in _split_lines(_iter_plain_chunks(path)):
+            nbytes = len(line_bytes)
+            line = line_bytes.decode("utf-8", errors="replace")
+            yield line, {"path": path, "inode": inode, "offset": offset, "size": size, "mtime": mtime}, nbytes
+            offset += nbytes
 
 
-def follow_active_binary(offset: int, max_wait_sec: float = 0.5) -> Generator[Tuple[str, int], None, None]:
+def follow_active_binary(offset: int, max_wait_sec: float = 0.5) -> Generator[Tuple[str, int, int], None, None]:
     """
-    Tail ACTIVE_PATH from byte offset. Yield (line, new_offset).
+    Tail ACTIVE_PATH from byte offset. Yield (line, new_offset, line_nbytes).
     IMPORTANT: This generator will return if no new bytes arrive within max_wait_sec.
     This allows the caller (main loop) to keep control (rotate scan, checkpoint flush, metrics emit).
     """
     start_wait = time.time()
 
-    with open(ACTIVE_PATH, "rb") as f:
+    with open(ACTIVE_PATH, "rb", buffering=0) as f:
         f.seek(offset, os.SEEK_SET)
-        buf = b""
+        # bytearray so extend / head-trim happen in place instead of copying the tail
+        buf = bytearray()
         while True:
-            chunk = f.read(8192)
+            chunk = f.read(_READ_CHUNK)
             if not chunk:
                 if (time.time() - start_wait) >= max_wait_sec:
                     return
@@ -67,7 +145,7 @@ def follow_active_binary(offset: int, max_wait_sec: float = 0.5) -> Generator[Tu
                 continue
 
             start_wait = time.time()
-            buf += chunk
+            buf.extend(chunk)
 
             while True:
                 nl = buf.find(b"\n")
@@ -75,10 +153,11 @@ def follow_active_binary(offset: int, max_wait_sec: float = 0.5) -> Generator[Tu
                     break
 
                 line_bytes = buf[:nl + 1]
-                buf = buf[nl + 1:]
-                offset += len(line_bytes)
+                del buf[:nl + 1]
+                nbytes = len(line_bytes)
+                offset += nbytes
                 line = line_bytes.decode("utf-8", errors="replace")
-                yield line, offset
+                yield line, offset, nbytes
 
 
 def active_inode() -> Optional[int]: